@@ -1,133 +1,272 @@
 # File: app.py
-from flask import Flask, jsonify
+from datetime import date
+from functools import lru_cache
+import os
+import tempfile
+
+from flask import Flask, Response
 from flask_cors import CORS
+import numpy as np
+import orjson
 import pandas as pd
-from datetime import datetime, timedelta
 
 app = Flask(__name__)
 CORS(app)
 
-CSV_PATH = "../kmrl_train_30day_log.csv"
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kmrl_train_30day_log.csv")
+# Bump whenever read_train_log changes the prepared frame (columns, dtypes,
+# derived fields) so an older pickle is never loaded in its place
+CACHE_VERSION = 1
+CACHE_PATH = os.path.splitext(CSV_PATH)[0] + f".v{CACHE_VERSION}.pkl"
+CATEGORY_COLUMNS = ['Train ID', 'Yard Position', 'Status', 'Job-card Status', 'Branding Active']
+
+# Classify job cards once at load so the routes compare small ints instead of
+# lowercasing and prefix-matching strings on every request
+JC_NONE, JC_MINOR, JC_CRITICAL = 0, 1, 2
+JOB_CARD_SEVERITY = {"open-critical": JC_CRITICAL, "open-minor": JC_MINOR}
+
+def read_train_log(csv_path):
+    df = pd.read_csv(
+        csv_path,
+        # Low-cardinality text columns as categories: 1-byte codes instead of
+        # Python strings for grouping, dedup and memory
+        dtype={col: 'category' for col in CATEGORY_COLUMNS}
+    )
+
+    # Parse each date column once; an explicit format keeps pandas on the fast
+    # strptime path (repeated strings are parsed once) and bad cells become NaT
+    for col in ['Date', 'Fitness Validity', 'Last Cleaned']:
+        df[col] = pd.to_datetime(df[col], format='%d-%m-%Y', errors='coerce', cache=True)
+
+    df['Mileage (km)'] = pd.to_numeric(df['Mileage (km)'], errors='coerce', downcast='integer')
+
+    df['_jc_sev'] = (
+        df['Job-card Status'].str.lower()
+        .str.extract(r"^(open-critical|open-minor)", expand=False)
+        .map(JOB_CARD_SEVERITY)
+        .fillna(JC_NONE)
+        .astype('int8')
+    )
+    return df
+
+def load_train_log(csv_path=CSV_PATH, cache_path=CACHE_PATH):
+    # The prepared frame is pickled next to the CSV so restarts (e.g. the
+    # debug reloader) skip parsing; a newer CSV invalidates the cache, and an
+    # unreadable cache (truncated, other pandas version) falls back to the CSV
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception:
+            pass
+    df = read_train_log(csv_path)
+    # Write to a temp file and rename it into place so concurrent workers or an
+    # interrupted write never leave a partial pickle at cache_path
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(cache_path) + ".", suffix=".tmp", dir=os.path.dirname(cache_path)
+        )
+        os.close(fd)
+        os.chmod(tmp_path, 0o644)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
+df = load_train_log()
 
-# Load CSV with proper date parsing
-df = pd.read_csv(
-    CSV_PATH, 
-    parse_dates=['Date', 'Fitness Validity', 'Last Cleaned'], 
-    dayfirst=True
+# df is never mutated after load, so the latest row per train is computed once
+# here instead of re-grouping and re-sorting on every request. Rows without a
+# Train ID are dropped first, as groupby("Train ID") did.
+LATEST = (
+    df.dropna(subset=["Train ID"])
+    .sort_values("Date")
+    .drop_duplicates("Train ID", keep="last")
+    .set_index("Train ID")
+    .sort_index()
 )
 
-# Ensure datetime and numeric types are properly cast
-for col in ['Date', 'Fitness Validity', 'Last Cleaned']:
-    df[col] = pd.to_datetime(df[col], errors='coerce')
-
-df['Mileage (km)'] = pd.to_numeric(df['Mileage (km)'], errors='coerce')
-
-def calculate_next_service(last_cleaned, mileage):
-    if pd.isna(last_cleaned):
-        last_cleaned = datetime.now()
-    next_date = last_cleaned + timedelta(days=15)
-    next_mileage = int(mileage) + 2000 if mileage is not None else 2000
-    return next_date, next_mileage
-
-def determine_fitness_status(fitness_validity, job_card_status):
-    today = pd.Timestamp.today()
-    if pd.isna(fitness_validity):
-        fitness_validity = today
-    if job_card_status.lower().startswith("open-critical") or fitness_validity <= today:
-        return "Critical"
-    elif job_card_status.lower().startswith("open-minor") or fitness_validity <= today + pd.Timedelta(days=5):
-        return "Minor"
-    else:
-        return "Healthy"
+# /api/recommendation only needs three static fields per train, so it works on
+# a small structured array instead of going through pandas per request
+_TRAIN_IDS = LATEST.index.astype(str)
+# Size the ID field from the data so long train IDs are never truncated
+_TRAIN_ID_WIDTH = max((len(train_id) for train_id in _TRAIN_IDS), default=1)
+RECOMMENDATION_FIELDS = np.empty(
+    len(LATEST),
+    dtype=[
+        ("train_id", f"U{_TRAIN_ID_WIDTH}"),
+        ("fitness_validity", "datetime64[us]"),
+        ("jc_sev", "i1"),
+    ],
+)
+RECOMMENDATION_FIELDS["train_id"] = _TRAIN_IDS
+RECOMMENDATION_FIELDS["fitness_validity"] = LATEST["Fitness Validity"].to_numpy(dtype="datetime64[us]")
+RECOMMENDATION_FIELDS["jc_sev"] = LATEST["_jc_sev"].to_numpy()
+
+def next_service_date(last_cleaned, today):
+    return last_cleaned.fillna(today) + pd.Timedelta(days=15)
+
+def next_service_mileage(mileage):
+    return mileage.fillna(0).astype("int64") + 2000
+
+# Fitness statuses indexed by urgency code, most urgent first
+FITNESS_STATUSES = np.array(["Critical", "Minor", "Healthy"])
+
+def fitness_urgency(fitness_validity, jc_severity, today):
+    fitness_validity = np.where(np.isnat(fitness_validity), today, fitness_validity)
+    return np.where(
+        (jc_severity == JC_CRITICAL) | (fitness_validity <= today),
+        0,
+        np.where(
+            (jc_severity == JC_MINOR) | (fitness_validity <= today + np.timedelta64(5, "D")),
+            1,
+            2,
+        ),
+    ).astype("int8")
+
+def determine_fitness_status(fitness_validity, jc_severity, today):
+    return FITNESS_STATUSES[fitness_urgency(fitness_validity, jc_severity, today)]
+
+CONSEQUENCES = {
+    "Critical": "Safety risk, possible downtime",
+    "Minor": "May cause minor delays or service issues",
+    "Healthy": "No immediate risk",
+}
 
 def consequence_if_skipped(fitness_status):
-    if fitness_status == "Critical":
-        return "Safety risk, possible downtime"
-    elif fitness_status == "Minor":
-        return "May cause minor delays or service issues"
-    else:
-        return "No immediate risk"
+    return pd.Series(fitness_status).map(CONSEQUENCES).to_numpy()
+
+def _dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY)
+
+def _format_date(dates):
+    return dates.dt.strftime("%Y-%m-%d").astype(object).where(dates.notna(), None)
+
+def _nullable_int(values):
+    # Only pay for the object/None conversion when something is actually missing
+    if not values.hasnans:
+        return values.astype("int64")
+    return values.astype("Int64").astype(object).where(values.notna(), None)
+
+def _build_status_base(latest):
+    # Fields that do not depend on today, built once per train. The today-
+    # dependent keys are None placeholders so patched dicts keep key order.
+    # Columns are plain lists (not a DataFrame) so missing values stay None.
+    next_mileage = next_service_mileage(latest["Mileage (km)"])
+    placeholder = [None] * len(latest)
+    columns = {
+        "train_id": latest.index.astype(str).tolist(),
+        "yard_position": latest["Yard Position"].astype(str).tolist(),
+        "last_run_date": _format_date(latest["Date"]).tolist(),
+        "next_service_due_date": placeholder,
+        "next_service_due_mileage": next_mileage.tolist(),
+        "days_until_next_service": placeholder,
+        "mileage_remaining": _nullable_int(next_mileage - latest["Mileage (km)"]).tolist(),
+        "fitness_status": placeholder,
+        "fitness_validity": _format_date(latest["Fitness Validity"]).tolist(),
+        "days_until_fitness_expiry": placeholder,
+        "job_card_status": latest["Job-card Status"].astype(str).tolist(),
+        "status": latest["Status"].astype(str).tolist(),
+        "consequence_if_skipped": placeholder,
+    }
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+STATUS_BASE = _build_status_base(LATEST)
+
+def _reference_time(date_key):
+    # Every date in the log is at midnight, so any instant strictly inside the
+    # day gives the same day counts and statuses as a wall-clock reading taken
+    # that day. Deriving it from date_key keeps computed fields and the cache
+    # key on the same day even if a request straddles midnight.
+    return pd.Timestamp(date.fromordinal(date_key)) + pd.Timedelta(hours=12)
+
+# The CSV is static and every "today"-dependent field only changes at
+# midnight, so each response body is built and serialized once per day
+@lru_cache(maxsize=2)
+def _build_current_status(date_key):
+    today = _reference_time(date_key)
+    today64 = today.to_datetime64()
+    latest = LATEST
+    one_day = np.timedelta64(1, "D")
+
+    service_date = next_service_date(latest["Last Cleaned"], today)
+    fitness_validity = latest["Fitness Validity"].to_numpy()
+    fitness_missing = np.isnat(fitness_validity)
+    fitness_status = determine_fitness_status(fitness_validity, latest["_jc_sev"].to_numpy(), today64)
+
+    # Whole-array floor division matches Timedelta.days (floors toward -inf)
+    days_until_next_service = (service_date.to_numpy() - today64) // one_day
+    days_until_fitness_expiry = np.where(
+        fitness_missing,
+        None,
+        (np.where(fitness_missing, today64, fitness_validity) - today64) // one_day,
+    )
+
+    status_list = [
+        {
+            **base,
+            "next_service_due_date": due_date,
+            "days_until_next_service": days_service,
+            "fitness_status": status,
+            "days_until_fitness_expiry": days_fitness,
+            "consequence_if_skipped": consequence,
+        }
+        for base, due_date, days_service, status, days_fitness, consequence in zip(
+            STATUS_BASE,
+            service_date.dt.strftime("%Y-%m-%d").tolist(),
+            days_until_next_service.tolist(),
+            fitness_status.tolist(),
+            days_until_fitness_expiry.tolist(),
+            consequence_if_skipped(fitness_status).tolist(),
+        )
+    ]
+    return _dumps(status_list)
+
+@lru_cache(maxsize=2)
+def _build_recommendation(date_key):
+    today = _reference_time(date_key).to_datetime64()
+    fitness_validity = RECOMMENDATION_FIELDS["fitness_validity"]
+    severity = RECOMMENDATION_FIELDS["jc_sev"]
+
+    urgency = fitness_urgency(fitness_validity, severity, today)
+    reasons = np.select(
+        [
+            severity == JC_CRITICAL,
+            severity == JC_MINOR,
+            fitness_validity <= today + np.timedelta64(3, "D"),
+        ],
+        ["Open-Critical Job Card", "Open-Minor Job Card", "Fitness Validity expiring soon"],
+        default="Scheduled Service",
+    )
+
+    # Prioritize Critical -> Minor -> Healthy, keeping train order within each
+    order = np.argsort(urgency, kind="stable")
+    recommendations = [
+        {
+            "train_id": train_id,
+            "reason": reason,
+            "consequence_if_skipped": CONSEQUENCES[fitness_status],
+            "fitness_status": fitness_status,
+        }
+        for train_id, reason, fitness_status in zip(
+            RECOMMENDATION_FIELDS["train_id"][order].tolist(),
+            reasons[order].tolist(),
+            FITNESS_STATUSES[urgency[order]].tolist(),
+        )
+    ]
+    return _dumps(recommendations)
 
 @app.route("/api/current_status")
 def current_status():
-    status_list = []
-    today = pd.Timestamp.today()
-
-    for train_id, group in df.groupby("Train ID"):
-        last_run = group.sort_values("Date").iloc[-1]
-        last_date = last_run["Date"]
-        mileage = last_run["Mileage (km)"]
-        job_card = last_run["Job-card Status"]
-        fitness_validity = last_run["Fitness Validity"]
-        yard_pos = last_run["Yard Position"]
-        status = last_run["Status"]
-
-        next_service_date, next_service_mileage = calculate_next_service(last_run["Last Cleaned"], mileage)
-        fitness_status = determine_fitness_status(fitness_validity, job_card)
-        consequence = consequence_if_skipped(fitness_status)
-
-        # Calculate additional useful metrics
-        days_until_next_service = (next_service_date - today).days
-        mileage_remaining = next_service_mileage - int(mileage) if mileage is not None else None
-        days_until_fitness_expiry = (fitness_validity - today).days if fitness_validity is not pd.NaT else None
-
-        status_list.append({
-            "train_id": str(train_id),
-            "yard_position": str(yard_pos),
-            "last_run_date": last_date.strftime("%Y-%m-%d") if last_date is not pd.NaT else None,
-            "next_service_due_date": next_service_date.strftime("%Y-%m-%d"),
-            "next_service_due_mileage": next_service_mileage,
-            "days_until_next_service": int(days_until_next_service),
-            "mileage_remaining": int(mileage_remaining) if mileage_remaining is not None else None,
-            "fitness_status": str(fitness_status),
-            "fitness_validity": fitness_validity.strftime("%Y-%m-%d") if fitness_validity is not pd.NaT else None,
-            "days_until_fitness_expiry": int(days_until_fitness_expiry) if days_until_fitness_expiry is not None else None,
-            "job_card_status": str(job_card),
-            "status": str(status),
-            "consequence_if_skipped": str(consequence)
-        })
-
-    return jsonify(status_list)
+    body = _build_current_status(date.today().toordinal())
+    return Response(body, mimetype="application/json")
 
 @app.route("/api/recommendation")
 def recommendation():
-    recommendations = []
-    today = pd.Timestamp.today()
-
-    for train_id, group in df.groupby("Train ID"):
-        last_row = group.sort_values("Date").iloc[-1]
-        fitness_status = determine_fitness_status(last_row["Fitness Validity"], last_row["Job-card Status"])
-        status = last_row["Status"]
-        job_card = last_row["Job-card Status"]
-
-        reason = ""
-        if job_card.lower().startswith("open-critical"):
-            reason = "Open-Critical Job Card"
-        elif job_card.lower().startswith("open-minor"):
-            reason = "Open-Minor Job Card"
-        elif last_row["Fitness Validity"] <= today + pd.Timedelta(days=3):
-            reason = "Fitness Validity expiring soon"
-        else:
-            reason = "Scheduled Service"
-
-        recommendations.append({
-            "train_id": str(train_id),
-            "reason": reason,
-            "consequence_if_skipped": consequence_if_skipped(fitness_status),
-            "fitness_status": str(fitness_status)
-        })
-
-    # Prioritize Critical -> Minor -> Healthy
-    def urgency(item):
-        if item["fitness_status"] == "Critical":
-            return 0
-        elif item["fitness_status"] == "Minor":
-            return 1
-        else:
-            return 2
-
-    recommendations.sort(key=urgency)
-    return jsonify(recommendations)
+    body = _build_recommendation(date.today().toordinal())
+    return Response(body, mimetype="application/json")
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -19,11 +19,23 @@ def load_and_prepare(df):
     df['last_cleaned'] = pd.to_datetime(df['last_cleaned'], format="%d-%m-%Y", errors='coerce')
     return df
 
+def _group_features(train_ids, mileage):
+    # One pass over rows sorted by train then date: each group's start offset
+    # gives its last row and lets reduceat take per-group mileage max/min
+    if len(train_ids) == 0:
+        return np.empty(0, dtype=np.intp), mileage[:0]
+    starts = np.flatnonzero(np.r_[True, train_ids[1:] != train_ids[:-1]])
+    last_idx = np.r_[starts[1:], len(train_ids)] - 1
+    mileage_30 = np.fmax.reduceat(mileage, starts) - np.fmin.reduceat(mileage, starts)
+    return last_idx, mileage_30
+
 def compute_latest(df):
-    latest = df.sort_values(['train_id','date']).groupby('train_id').tail(1).reset_index(drop=True)
+    # Reference date comes from every row, including ones without a train_id
     latest_date = df['date'].max()
-    mileage_30 = df.groupby('train_id')['mileage_km'].agg(lambda x: x.max()-x.min()).reset_index().rename(columns={'mileage_km':'mileage_30'})
-    latest = latest.merge(mileage_30, on='train_id', how='left')
+    df = df.dropna(subset=['train_id']).sort_values(['train_id','date'])
+    last_idx, mileage_30 = _group_features(df['train_id'].to_numpy(), df['mileage_km'].to_numpy())
+    latest = df.iloc[last_idx].reset_index(drop=True)
+    latest['mileage_30'] = mileage_30
     latest['fitness_days_left'] = (latest['fitness_validity_date'] - latest_date).dt.days.fillna(0).astype(int)
     latest['job_card_open'] = latest['job_card_status'].str.contains('Open', case=False, na=False)
     latest['branding_boost'] = latest['branding_active'].str.strip().str.lower().eq('yes').astype(int)
@@ -31,40 +43,87 @@ def compute_latest(df):
     latest['needs_cleaning'] = latest['days_since_clean'] > 2
     return latest, latest_date
 
-def score_and_rank(latest_df):
-    latest = latest_df.copy()
-    max_days = max(latest['fitness_days_left'].max(),1)
-    latest['fitness_score'] = latest['fitness_days_left'] / (max_days + 1)
-    if latest['mileage_30'].max() != latest['mileage_30'].min():
-        latest['mileage_score'] = 1 - ((latest['mileage_30'] - latest['mileage_30'].min()) / (latest['mileage_30'].max() - latest['mileage_30'].min()))
-    else:
-        latest['mileage_score'] = 0.5
-    latest['clean_penalty'] = latest['needs_cleaning'].apply(lambda x: -0.5 if x else 0)
-    latest['job_card_penalty'] = latest['job_card_open'].apply(lambda x: -5 if x else 0)
-    latest['composite_score'] = (latest['fitness_score'] * 3) + (latest['mileage_score'] * 2) + latest['branding_boost'] + latest['clean_penalty'] + latest['job_card_penalty']
+def _score_components(fitness_days_left, mileage_30, branding_boost, needs_cleaning, job_card_open):
+    n = len(fitness_days_left)
+    if n == 0:
+        return {col: np.empty(0) for col in ('fitness_score', 'mileage_score', 'clean_penalty', 'job_card_penalty', 'composite_score')}
+    # nan-aware reductions to match the pandas Series.min()/max() this replaced
+    fitness_score = fitness_days_left / (max(np.nanmax(fitness_days_left), 1) + 1)
+    lo, hi = np.nanmin(mileage_30), np.nanmax(mileage_30)
+    mileage_score = 1 - ((mileage_30 - lo) / (hi - lo)) if hi != lo else np.full(n, 0.5)
+    clean_penalty = np.where(needs_cleaning, -0.5, 0.0)
+    job_card_penalty = np.where(job_card_open, -5.0, 0.0)
+    return {
+        'fitness_score': fitness_score,
+        'mileage_score': mileage_score,
+        'clean_penalty': clean_penalty,
+        'job_card_penalty': job_card_penalty,
+        'composite_score': (fitness_score * 3) + (mileage_score * 2) + branding_boost + clean_penalty + job_card_penalty,
+    }
+
+def score_and_rank(latest_df, *, copy=False):
+    components = _score_components(
+        latest_df['fitness_days_left'].to_numpy(dtype=np.float64),
+        latest_df['mileage_30'].to_numpy(dtype=np.float64),
+        latest_df['branding_boost'].to_numpy(dtype=np.float64),
+        latest_df['needs_cleaning'].to_numpy(dtype=bool),
+        latest_df['job_card_open'].to_numpy(dtype=bool),
+    )
+    # A shallow copy is enough here: only new columns are added before sort_values
+    latest = latest_df.copy(deep=False) if copy else latest_df
+    for col, values in components.items():
+        latest[col] = values
     latest = latest.sort_values('composite_score', ascending=False).reset_index(drop=True)
-    latest['recommended_action'] = latest.apply(lambda r: 'Service' if (r['composite_score']>0 and not r['job_card_open']) else ('Maintenance' if r['job_card_open'] else 'Standby'), axis=1)
+    cs = latest['composite_score'].to_numpy()
+    jco = latest['job_card_open'].to_numpy(dtype=bool)
+    latest['recommended_action'] = np.select([jco, (cs>0) & ~jco], ['Maintenance','Service'], default='Standby')
     return latest
 
-def apply_overrides(latest_df, overrides: dict):
-    latest = latest_df.copy()
-    for train, changes in (overrides or {}).items():
-        mask = latest['train_id']==train
-        if not mask.any():
-            continue
+# Columns written by each override key, so copy=True only duplicates those
+OVERRIDE_COLUMNS = {
+    'job_card_status': ['job_card_status', 'job_card_open'],
+    'mark_cleaned': ['needs_cleaning', 'days_since_clean'],
+    'branding_active': ['branding_active', 'branding_boost'],
+    'fitness_validity_date': ['fitness_validity_date'],
+}
+
+def apply_overrides(latest_df, overrides: dict, *, copy=False):
+    known = set(latest_df['train_id'])
+    overrides = {train: changes for train, changes in (overrides or {}).items() if train in known}
+    if not overrides:
+        return latest_df
+    if copy:
+        touched = {col for changes in overrides.values() for key in changes for col in OVERRIDE_COLUMNS.get(key, ())}
+        # Shallow frame plus deep copies of just the columns written below;
+        # assign() would deep-copy everything on pandas without copy-on-write
+        latest = latest_df.copy(deep=False)
+        for col in touched:
+            latest[col] = latest_df[col].copy()
+    else:
+        latest = latest_df
+    # Bucket overrides as column -> {train: value} so each column is written in one pass
+    bucketed = {}
+    for train, changes in overrides.items():
         if 'job_card_status' in changes:
-            latest.loc[mask, 'job_card_status'] = changes['job_card_status']
-            latest.loc[mask, 'job_card_open'] = str(changes['job_card_status']).lower().find('open')!=-1
+            bucketed.setdefault('job_card_status', {})[train] = changes['job_card_status']
         if 'mark_cleaned' in changes and changes['mark_cleaned']:
-            latest.loc[mask, 'needs_cleaning'] = False
-            latest.loc[mask, 'days_since_clean'] = 0
+            bucketed.setdefault('needs_cleaning', {})[train] = False
+            bucketed.setdefault('days_since_clean', {})[train] = 0
         if 'branding_active' in changes:
-            latest.loc[mask, 'branding_active'] = changes['branding_active']
-            latest.loc[mask, 'branding_boost'] = 1 if str(changes['branding_active']).strip().lower()=='yes' else 0
+            bucketed.setdefault('branding_active', {})[train] = changes['branding_active']
         if 'fitness_validity_date' in changes:
             try:
-                d = pd.to_datetime(changes['fitness_validity_date'])
-                latest.loc[mask, 'fitness_validity_date'] = d
+                bucketed.setdefault('fitness_validity_date', {})[train] = pd.to_datetime(changes['fitness_validity_date'])
             except:
                 pass
+    for col, mapping in bucketed.items():
+        # Mask from the keys, not the values, so None/NaN overrides clear the field
+        mask = latest['train_id'].isin(mapping.keys())
+        # map() returns object dtype for mixed/None values; cast back so the
+        # column keeps its dtype (bool, int, datetime) as scalar writes did
+        latest.loc[mask, col] = latest.loc[mask, 'train_id'].map(mapping).astype(latest[col].dtype)
+    if 'job_card_status' in bucketed:
+        latest['job_card_open'] = latest['job_card_status'].str.contains('open', case=False, na=False)
+    if 'branding_active' in bucketed:
+        latest['branding_boost'] = latest['branding_active'].str.strip().str.lower().eq('yes').astype(int)
     return latest
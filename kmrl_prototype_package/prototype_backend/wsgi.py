@@ -0,0 +1,5 @@
+# File: wsgi.py
+# WSGI entrypoint, e.g.: gunicorn -w 8 --preload wsgi:application
+# --preload imports app (and loads the train log) once in the master so the
+# workers share the prepared DataFrame pages copy-on-write after fork.
+from app import app as application